@@ -0,0 +1,171 @@
+# app/admission.py
+
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+# --- Configuration ---
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "8"))
+MAX_QUEUED_REQUESTS = int(os.getenv("MAX_QUEUED_REQUESTS", "16"))
+# Per-client rate limit, off (0) by default: without FRONTEND_TOKEN every frontend user shares one IP
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "0"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "5"))
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "30"))
+MAX_TRACKED_CLIENTS = 10000
+# Peers (e.g. a reverse proxy) whose X-Forwarded-For header is trusted, comma-separated IPs
+TRUSTED_PROXIES = {ip.strip() for ip in os.getenv("TRUSTED_PROXIES", "").split(",") if ip.strip()}
+# Shared secret identifying our own frontend, which may forward a per-session X-Client-ID
+FRONTEND_TOKEN = os.getenv("FRONTEND_TOKEN")
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's deadline passes before the pipeline finishes."""
+
+
+def remaining_time(deadline: float | None, stage: str) -> float | None:
+    """Returns seconds left before `deadline` (time.monotonic()), raising if it has passed."""
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded(f"Deadline exceeded before stage '{stage}'.")
+    return remaining
+
+
+class TokenBucket:
+    """Per-client token bucket refilled at `rate` tokens per second."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def try_acquire(self) -> float:
+        """Takes one token. Returns 0 on success, otherwise seconds until a token is available."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def refund(self):
+        """Returns a token taken by a request that was then shed for overload."""
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class AdmissionController:
+    """Bounds concurrent and queued /recommend requests and rate-limits clients.
+
+    Requests beyond the queue bound, over their client's rate, or whose
+    deadline passes while queued are rejected immediately with 429/503 and a
+    Retry-After header instead of waiting behind slow LLM calls.
+    """
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENT_REQUESTS, max_queue: int = MAX_QUEUED_REQUESTS,
+                 rate_per_minute: float = RATE_LIMIT_PER_MINUTE, burst: int = RATE_LIMIT_BURST,
+                 default_deadline_s: float = REQUEST_DEADLINE_SECONDS):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.rate_per_second = rate_per_minute / 60
+        if self.rate_per_second > 0 and not FRONTEND_TOKEN:
+            logging.warning("RATE_LIMIT_PER_MINUTE is set but FRONTEND_TOKEN is not: all users of the "
+                            "frontend share one rate-limit bucket (its IP). Set FRONTEND_TOKEN in app/.env and frontend/.env.")
+        self.burst = burst
+        self.default_deadline_s = default_deadline_s
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._buckets = OrderedDict()
+        self._in_flight = 0
+        self._queued = 0
+        self._admitted = 0
+        self._shed = defaultdict(int)
+        self._avg_service_s = 5.0  # running estimate used for Retry-After on 503s
+
+    def deadline_for(self, requested_timeout_s: float | None = None) -> float:
+        """Returns an absolute deadline (time.monotonic()) capped at the default budget."""
+        budget = self.default_deadline_s
+        if requested_timeout_s is not None and requested_timeout_s > 0:
+            budget = min(budget, requested_timeout_s)
+        return time.monotonic() + budget
+
+    def record_shed(self, reason: str):
+        """Counts a request that was rejected or abandoned."""
+        self._shed[reason] += 1
+        logging.warning(f"Shedding request: {reason} (in_flight={self._in_flight}, queued={self._queued})")
+
+    def _reject(self, status_code: int, reason: str, retry_after_s: float):
+        self.record_shed(reason)
+        raise HTTPException(
+            status_code=status_code,
+            detail=f"Service busy ({reason}). Please retry later.",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after_s)))},
+        )
+
+    def _take_token(self, client_id: str) -> float:
+        if self.rate_per_second <= 0:
+            return 0.0
+        bucket = self._buckets.get(client_id)
+        if bucket is None:
+            bucket = self._buckets[client_id] = TokenBucket(self.rate_per_second, self.burst)
+            if len(self._buckets) > MAX_TRACKED_CLIENTS:
+                self._buckets.popitem(last=False)  # Evict the least recently seen client
+        else:
+            self._buckets.move_to_end(client_id)
+        return bucket.try_acquire()
+
+    def _estimated_wait_s(self) -> float:
+        return self._avg_service_s * (self._queued + 1) / self.max_concurrency
+
+    @asynccontextmanager
+    async def admit(self, client_id: str, deadline: float):
+        """Admits one request or raises HTTPException(429/503)."""
+        # Overload is checked first so a 503 doesn't use up the client's rate budget
+        if self._queued + self._in_flight >= self.max_concurrency + self.max_queue:
+            self._reject(503, "queue_full", self._estimated_wait_s())
+
+        wait_s = self._take_token(client_id)
+        if wait_s > 0:
+            self._reject(429, "rate_limited", wait_s)
+
+        self._queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            bucket = self._buckets.get(client_id)
+            if bucket is not None:
+                bucket.refund()
+            self._reject(503, "deadline_in_queue", self._estimated_wait_s())
+        finally:
+            self._queued -= 1
+
+        self._in_flight += 1
+        self._admitted += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+            self._avg_service_s = 0.9 * self._avg_service_s + 0.1 * (time.monotonic() - start)
+
+    def snapshot(self) -> dict:
+        """Returns queue depth, in-flight and shed counters."""
+        return {
+            "in_flight": self._in_flight,
+            "queue_depth": self._queued,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "admitted": self._admitted,
+            "shed": dict(self._shed),
+            "avg_service_s": self._avg_service_s,
+        }
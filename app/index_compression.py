@@ -0,0 +1,198 @@
+# app/index_compression.py
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+
+import faiss
+import numpy as np
+
+# --- Configuration ---
+INDEX_REDUCED_DIM = int(os.getenv("INDEX_REDUCED_DIM", "128"))
+INDEX_TRANSFORM = os.getenv("INDEX_TRANSFORM", "pca")              # "pca", "opq" or "none"
+INDEX_STORAGE = os.getenv("INDEX_STORAGE", "int8")                 # "fp32", "fp16" or "int8"
+INDEX_RESCORE = os.getenv("INDEX_RESCORE", "false").lower() == "true"
+# Re-scoring keeps a full-dimension copy of every vector in RAM: fp16 costs half the original
+# index, fp32 (exact distances) as much as the original, on top of the compressed index
+INDEX_RESCORE_STORAGE = os.getenv("INDEX_RESCORE_STORAGE", "fp16")
+INDEX_RESCORE_K_FACTOR = float(os.getenv("INDEX_RESCORE_K_FACTOR", "4"))
+OPQ_SUBSPACES = 16
+
+_SCALAR_QUANTIZERS = {
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+    "int8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+# Configurations compared by `--sweep`: (transform, reduced_dim, storage, rescore)
+SWEEP_CONFIGS = [
+    ("none", None, "fp16", False),
+    ("none", None, "int8", False),
+    ("pca", 192, "fp16", False),
+    ("pca", 128, "int8", False),
+    ("pca", 64, "int8", False),
+    ("opq", 128, "int8", False),
+    ("pca", 64, "int8", True),
+]
+
+
+def _make_transform(transform: str, d_in: int, d_out: int | None):
+    """Returns the FAISS vector transform for the requested dimension reduction, or None."""
+    if transform == "none" or not d_out or d_out >= d_in:
+        return None
+    if transform == "pca":
+        return faiss.PCAMatrix(d_in, d_out)
+    if transform == "opq":
+        if d_out % OPQ_SUBSPACES:
+            raise ValueError(f"OPQ output dimension {d_out} must be a multiple of {OPQ_SUBSPACES}.")
+        return faiss.OPQMatrix(d_in, OPQ_SUBSPACES, d_out)
+    raise ValueError(f"Unknown index transform: {transform}")
+
+
+def _make_storage(storage: str, d: int, metric: int):
+    """Returns an empty flat index storing `d`-dimensional vectors as fp32, fp16 or int8."""
+    if storage == "fp32":
+        return faiss.IndexFlat(d, metric)
+    if storage not in _SCALAR_QUANTIZERS:
+        raise ValueError(f"Unknown index storage: {storage}")
+    return faiss.IndexScalarQuantizer(d, _SCALAR_QUANTIZERS[storage], metric)
+
+
+def build_compressed_index(vectors: np.ndarray, metric: int = faiss.METRIC_L2,
+                           reduced_dim: int | None = INDEX_REDUCED_DIM,
+                           transform: str = INDEX_TRANSFORM,
+                           storage: str = INDEX_STORAGE,
+                           rescore: bool = INDEX_RESCORE,
+                           rescore_storage: str = INDEX_RESCORE_STORAGE,
+                           rescore_k_factor: float = INDEX_RESCORE_K_FACTOR):
+    """Builds a compressed FAISS index over `vectors`.
+
+    The transform (PCA/OPQ) is trained on the vectors and wrapped in an
+    IndexPreTransform, so queries are projected automatically at search time.
+    With `rescore`, the top `k * rescore_k_factor` candidates are re-ranked
+    against full-dimension vectors kept in `rescore_storage` precision. That
+    copy stays resident next to the compressed index and outweighs it: fp16
+    gives up most of the savings, and fp32 (exact distances) makes the index
+    larger than the original.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    d = vectors.shape[1]
+
+    vector_transform = _make_transform(transform, d, reduced_dim)
+    base_dim = vector_transform.d_out if vector_transform is not None else d
+    index = _make_storage(storage, base_dim, metric)
+    if vector_transform is not None:
+        index = faiss.IndexPreTransform(vector_transform, index)
+    if rescore:
+        index = faiss.IndexRefine(index, _make_storage(rescore_storage, d, metric))
+        index.k_factor = rescore_k_factor
+
+    index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def compress_vectorstore(vectorstore, **kwargs):
+    """Replaces a LangChain FAISS vectorstore's index with a compressed copy.
+
+    Only full-precision flat indexes are compressed; an index that is already
+    compressed (e.g. written by this module's CLI) is left as is.
+    Vector ids keep their order, so `index_to_docstore_id` stays valid.
+    """
+    original = vectorstore.index
+    if not isinstance(original, faiss.IndexFlat):
+        logging.info(f"FAISS index is a {type(original).__name__}, not a flat index; skipping compression.")
+        return original
+    vectors = original.reconstruct_n(0, original.ntotal)
+    start = time.perf_counter()
+    vectorstore.index = build_compressed_index(vectors, metric=original.metric_type, **kwargs)
+    logging.info(f"Compressed FAISS index in {time.perf_counter() - start:.1f}s: "
+                 f"{index_size_bytes(original)} -> {index_size_bytes(vectorstore.index)} bytes")
+    return vectorstore.index
+
+
+def index_size_bytes(index) -> int:
+    """Returns the serialized size of an index (what is stored on GCS/Drive)."""
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def compression_report(vectors: np.ndarray, index, metric: int = faiss.METRIC_L2,
+                       k: int = 5, num_queries: int = 1000, seed: int = 0) -> dict:
+    """Compares a compressed index with exact search over the original vectors.
+
+    Indexed vectors are used as queries; each query's own vector is excluded
+    from both result lists, so recall@k measures neighbours, not self-matches.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    exact = faiss.IndexFlat(vectors.shape[1], metric)
+    exact.add(vectors)
+
+    rng = np.random.default_rng(seed)
+    query_ids = rng.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)
+    queries = vectors[query_ids]
+
+    _, exact_ids = exact.search(queries, k + 1)
+    start = time.perf_counter()
+    _, approx_ids = index.search(queries, k + 1)
+    search_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    hits = 0
+    for query_id, exact_row, approx_row in zip(query_ids, exact_ids, approx_ids):
+        truth = [i for i in exact_row if i != query_id][:k]
+        found = [i for i in approx_row if i != query_id][:k]
+        hits += len(set(truth) & set(found))
+
+    original_bytes = index_size_bytes(exact)
+    compressed_bytes = index_size_bytes(index)
+    # Part of compressed_bytes spent on the full-dimension re-scoring copy
+    rescore_bytes = index_size_bytes(index.refine_index) if isinstance(index, faiss.IndexRefine) else 0
+    return {
+        f"recall@{k}": hits / (k * len(queries)),
+        "original_bytes": original_bytes,
+        "compressed_bytes": compressed_bytes,
+        "rescore_bytes": rescore_bytes,
+        "memory_saved": 1 - compressed_bytes / original_bytes,
+        "bytes_per_vector": compressed_bytes / len(vectors),
+        "search_ms_per_query": search_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compress a FAISS recipe index and report memory vs. recall.")
+    parser.add_argument("--index-path", default="data/index/langchain_faiss", help="Directory with index.faiss/index.pkl")
+    parser.add_argument("--output-path", help="Directory to write the compressed index.faiss (and a copy of index.pkl)")
+    parser.add_argument("--dim", type=int, default=INDEX_REDUCED_DIM)
+    parser.add_argument("--transform", choices=["pca", "opq", "none"], default=INDEX_TRANSFORM)
+    parser.add_argument("--storage", choices=["fp32", "fp16", "int8"], default=INDEX_STORAGE)
+    parser.add_argument("--rescore", action="store_true", default=INDEX_RESCORE)
+    parser.add_argument("--rescore-storage", choices=["fp32", "fp16"], default=INDEX_RESCORE_STORAGE)
+    parser.add_argument("--sweep", action="store_true", help="Report several configurations instead of one")
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+
+    original = faiss.read_index(os.path.join(args.index_path, "index.faiss"))
+    vectors = original.reconstruct_n(0, original.ntotal)
+    metric = original.metric_type
+    logging.info(f"Loaded {original.ntotal} vectors of dimension {original.d}")
+
+    configs = SWEEP_CONFIGS if args.sweep else [(args.transform, args.dim, args.storage, args.rescore)]
+    for transform, dim, storage, rescore in configs:
+        index = build_compressed_index(vectors, metric=metric, reduced_dim=dim, transform=transform,
+                                       storage=storage, rescore=rescore, rescore_storage=args.rescore_storage)
+        report = compression_report(vectors, index, metric=metric, num_queries=args.queries)
+        config = {"transform": transform, "dim": dim or original.d, "storage": storage,
+                  "rescore": args.rescore_storage if rescore else False}
+        print(json.dumps({**config, **report}))
+
+    if args.output_path and not args.sweep:
+        os.makedirs(args.output_path, exist_ok=True)
+        faiss.write_index(index, os.path.join(args.output_path, "index.faiss"))
+        shutil.copy(os.path.join(args.index_path, "index.pkl"), os.path.join(args.output_path, "index.pkl"))
+        logging.info(f"Compressed index written to {args.output_path}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - [%(name)s:%(lineno)d] - %(message)s')
+    main()
@@ -1,6 +1,7 @@
 # app/main.py
 
 import os
+import asyncio
 import logging
 
 from fastapi import FastAPI
@@ -8,7 +9,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from app.routes import router
 
-from app.model_loader import initialize_rag_resources
+from app.resource_manager import RAGResourceManager, INDEX_WATCH_INTERVAL_SECONDS
+from app.admission import AdmissionController
 
 from dotenv import load_dotenv
 
@@ -22,24 +24,30 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - [%
 async def lifespan(app: FastAPI):
     """Handles application startup and shutdown events.
 
-    On startup: Initializes RAG resources (LLM, retriever, chains).
-    On shutdown: Can be used for cleanup if necessary.
+    On startup: Initializes RAG resources (LLM, retriever, chains) and, if
+    configured, starts watching the index files for hot reloads.
+    On shutdown: Stops the index watcher.
     """
     logging.info("Application startup: Initializing RAG resources...")
+    # Resources live in a manager so they can be reloaded without a restart
+    app.state.rag_manager = RAGResourceManager()
     try:
         # Load models, vector store, retriever, and chains
-        rag_resources = initialize_rag_resources()
-        # Store resources in application state for access in routes
-        app.state.rag_resources = rag_resources
+        await app.state.rag_manager.reload(reason="startup")
         logging.info("RAG resources initialized successfully and stored in app.state.")
     except Exception as e:
         # Critical failure if resources can't load
         logging.critical(f"Failed to initialize RAG resources during startup: {e}", exc_info=True)
         # Optionally, raise the exception to prevent the app from starting
         # raise
+
+    watch_task = None
+    if INDEX_WATCH_INTERVAL_SECONDS > 0:
+        watch_task = asyncio.create_task(app.state.rag_manager.watch_index(INDEX_WATCH_INTERVAL_SECONDS))
     yield
-    # --- Cleanup --- (Optional)
-    # Add any cleanup logic here (e.g., closing connections)
+    # --- Cleanup ---
+    if watch_task is not None:
+        watch_task.cancel()
     logging.info("Application shutdown.")
 
 # Initialize FastAPI app with lifespan manager
@@ -50,6 +58,9 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Bound concurrency/queueing and rate-limit clients on /recommend
+app.state.admission = AdmissionController()
+
 # --- CORS Configuration --- #
 # Read allowed origins from environment variable
 origins_str = os.getenv("ORIGINS") # Renamed for clarity
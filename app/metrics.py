@@ -0,0 +1,69 @@
+# app/metrics.py
+
+import threading
+from collections import defaultdict
+
+
+class PipelineMetrics:
+    """Thread-safe, in-process counters for the RAG pipeline.
+
+    Exposed through the `/metrics` endpoint. Values are cumulative since the
+    process started.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = defaultdict(lambda: {
+            "model": None,
+            "calls": 0,
+            "errors": 0,
+            "total_latency_s": 0.0,
+            "max_latency_s": 0.0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "total_cost_usd": 0.0,
+        })
+        self._plans = defaultdict(lambda: {"requests": 0, "skipped": defaultdict(int)})
+
+    def record_route_call(self, route: str, model: str, latency_s: float,
+                          prompt_tokens: int = 0, completion_tokens: int = 0,
+                          cost_usd: float = 0.0, error: bool = False):
+        """Records one LLM call made through a model route."""
+        with self._lock:
+            stats = self._routes[route]
+            stats["model"] = model
+            stats["calls"] += 1
+            stats["errors"] += int(error)
+            stats["total_latency_s"] += latency_s
+            stats["max_latency_s"] = max(stats["max_latency_s"], latency_s)
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+            stats["total_cost_usd"] += cost_usd
+
+    def record_plan(self, intent: str, skipped_stages: list[str]):
+        """Records which stages an intent's execution plan skipped for one request."""
+        with self._lock:
+            stats = self._plans[intent]
+            stats["requests"] += 1
+            for stage in skipped_stages:
+                stats["skipped"][stage] += 1
+
+    def snapshot(self) -> dict:
+        """Returns a JSON-serialisable copy of all counters."""
+        with self._lock:
+            routes = {}
+            for route, stats in self._routes.items():
+                stats = dict(stats)
+                calls = stats["calls"]
+                stats["avg_latency_s"] = stats["total_latency_s"] / calls if calls else 0.0
+                stats["avg_cost_usd"] = stats["total_cost_usd"] / calls if calls else 0.0
+                routes[route] = stats
+            plans = {
+                intent: {"requests": stats["requests"], "skipped": dict(stats["skipped"])}
+                for intent, stats in self._plans.items()
+            }
+            return {"routes": routes, "plans": plans}
+
+
+# Shared instance used by the pipeline and the /metrics route
+metrics = PipelineMetrics()
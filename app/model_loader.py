@@ -6,10 +6,14 @@ from app.prompts import *
 from langchain_community.vectorstores import FAISS # Updated import
 from langchain_community.embeddings import HuggingFaceEmbeddings # Updated import
 from langchain.docstore.document import Document
-from langchain_openai import ChatOpenAI
+from app.model_router import ModelRouter
+from app.recipe_index import RecipeNameIndex
+from app.index_compression import compress_vectorstore
+from app.retrieval import MMRRetriever
 import logging
 import os
 import gcsfs
+import shutil
 import tempfile
 import gdown
 from dotenv import load_dotenv
@@ -21,18 +25,67 @@ LANGCHAIN_FAISS_PATH = "data/index/langchain_faiss"
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
 LLM_MODEL_NAME = "gpt-3.5-turbo" 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Compress a full-precision index in memory at load time (see app/index_compression.py)
+INDEX_COMPRESSION = os.getenv("INDEX_COMPRESSION", "false").lower() == "true"
+
+# --- Model Routing ---
+FAST_LLM_MODEL_NAME = os.getenv("FAST_LLM_MODEL_NAME", LLM_MODEL_NAME)
+STRONG_LLM_MODEL_NAME = os.getenv("STRONG_LLM_MODEL_NAME", LLM_MODEL_NAME)
+
+# JSON/rewrite stages run at temperature 0 so their output is stable and cacheable.
+# The intent JSON repeats the cleaned query, so the extract cap leaves room for long queries.
+MODEL_ROUTES = {
+    "extract": {"model": FAST_LLM_MODEL_NAME, "temperature": 0.0, "max_tokens": 1500},
+    "rewrite": {"model": FAST_LLM_MODEL_NAME, "temperature": 0.0, "max_tokens": 64},
+    "answer_light": {"model": FAST_LLM_MODEL_NAME, "temperature": 0.7, "max_tokens": 1000},
+    "answer": {"model": STRONG_LLM_MODEL_NAME, "temperature": 0.7, "max_tokens": 2000},
+}
+# Default route for each pipeline stage
+STAGE_ROUTES = {
+    "intent": "extract",
+    "rewrite": "rewrite",
+    "answer": "answer",
+}
+# Per-intent overrides (intents come from query_clean_prompt)
+INTENT_ROUTES = {
+    "answer": {
+        "find_healthy_substitute": "answer_light",
+        "ask_cooking_technique": "answer_light",
+        "general_health_cooking_advice": "answer_light",
+        "unknown": "answer_light",
+    },
+}
+
+
+GCS_INDEX_BUCKET_PATH = "nutrirag-index/langchain_faiss"
+INDEX_FILES = ["index.faiss", "index.pkl"]
+
+
+def index_fingerprint() -> tuple:
+    """Returns a value that changes whenever the FAISS index files are replaced (GCS generation or local mtime/size)."""
+    is_cloud_env = os.getenv("IS_CLOUD_ENV", "false").lower() == "true"
+    if is_cloud_env:
+        fs = gcsfs.GCSFileSystem()
+        infos = [fs.info(f"{GCS_INDEX_BUCKET_PATH}/{fname}") for fname in INDEX_FILES]
+        return tuple((info.get("generation"), info.get("size")) for info in infos)
+    fingerprint = []
+    for fname in INDEX_FILES:
+        local_path = os.path.join(LANGCHAIN_FAISS_PATH, fname)
+        stat = os.stat(local_path) if os.path.exists(local_path) else None
+        fingerprint.append((stat.st_mtime_ns, stat.st_size) if stat else None)
+    return tuple(fingerprint)
 
 
 def _download_faiss_index_from_gcs() -> str:
     fs = gcsfs.GCSFileSystem()
-    bucket_path = "nutrirag-index/langchain_faiss"
+    bucket_path = GCS_INDEX_BUCKET_PATH
     tmpdir = tempfile.mkdtemp()
     fs.get(f"{bucket_path}/index.faiss", f"{tmpdir}/index.faiss")
     fs.get(f"{bucket_path}/index.pkl", f"{tmpdir}/index.pkl")
     return tmpdir  # local path to FAISS index files
 
 def _ensure_faiss_index_exists(local_dir=LANGCHAIN_FAISS_PATH):
-    index_files = ["index.faiss", "index.pkl"]
+    index_files = INDEX_FILES
     drive_base_url = "https://drive.google.com/uc?id="
 
     drive_file_ids = {
@@ -60,8 +113,14 @@ def _ensure_faiss_index_exists(local_dir=LANGCHAIN_FAISS_PATH):
 
 
 # --- Initialization Function ---
-def initialize_rag_resources():
-    """Loads and initializes all RAG components based on the provided snippet."""
+def initialize_rag_resources(llm_factory=None, embedding=None):
+    """Loads and initializes all RAG components based on the provided snippet.
+
+    Args:
+        llm_factory: Optional callable(model, temperature, max_tokens) used by the
+            model router instead of OpenAI (e.g. fake models for offline runs).
+        embedding: Optional already-loaded embedding model to reuse (e.g. on reload).
+    """
 
     is_cloud_env = os.getenv("IS_CLOUD_ENV", "false").lower() == "true"
     if is_cloud_env:
@@ -71,33 +130,33 @@ def initialize_rag_resources():
         index_path = LANGCHAIN_FAISS_PATH 
 
     logging.info("--- Starting RAG Resource Initialization ---")
-    embedding = None
     vectorstore = None
+    recipe_name_index = None
     retriever = None
-    llm = None
+    router = None
     intent_extraction_chain = None
     rewrite_chain = None
     answer_chain = None 
 
 
-    # 1. Initialize LLM (You need to replace this with your actual LLM setup)
-    logging.info("Initializing LLM (OpenAI GPT)...")
+    # 1. Initialize Model Router (one LLM per configured route)
+    logging.info("Initializing model router...")
     try:
-        # Ensure OPENAI_API_KEY environment variable is set
-        if not os.getenv("OPENAI_API_KEY"):
+        # Ensure OPENAI_API_KEY environment variable is set (not needed for injected models)
+        if llm_factory is None and not os.getenv("OPENAI_API_KEY"):
             raise ValueError("OPENAI_API_KEY environment variable not set.")
 
-        # Select the GPT model, e.g., "gpt-4o", "gpt-3.5-turbo"
-        llm = ChatOpenAI(model=LLM_MODEL_NAME, temperature=0.7)
-        logging.info("LLM (OpenAI GPT) initialized.")
+        router = ModelRouter(MODEL_ROUTES, STAGE_ROUTES, INTENT_ROUTES, llm_factory=llm_factory)
+        logging.info("Model router initialized.")
     except Exception as e:
-        logging.error(f"Error initializing OpenAI LLM: {e}", exc_info=True)
+        logging.error(f"Error initializing model router: {e}", exc_info=True)
         raise
 
-    # 2. Load Embedding Model
+    # 2. Load Embedding Model (unless one is being reused)
     logging.info(f"Loading embedding model: {EMBEDDING_MODEL_NAME}...")
     try:
-        embedding = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+        if embedding is None:
+            embedding = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
         logging.info("Embedding model loaded.")
     except Exception as e:
         logging.error(f"Error loading embedding model: {e}", exc_info=True)
@@ -111,11 +170,33 @@ def initialize_rag_resources():
     except Exception as e:
         logging.error(f"Error loading FAISS index: {e}", exc_info=True)
         raise
+    finally:
+        # The index is fully in memory now; don't leave a temp copy behind on every (re)load
+        if is_cloud_env:
+            shutil.rmtree(index_path, ignore_errors=True)
+
+    # 3a. Optionally apply dimension reduction and float16/int8 storage
+    if INDEX_COMPRESSION:
+        logging.info("Compressing FAISS index...")
+        try:
+            compress_vectorstore(vectorstore)
+        except Exception as e:
+            logging.error(f"Error compressing FAISS index: {e}", exc_info=True)
+            raise
+
+    # 3b. Build Recipe Name Lookup Index from the docstore metadata
+    logging.info("Building recipe name index...")
+    try:
+        recipe_name_index = RecipeNameIndex.from_vectorstore(vectorstore)
+    except Exception as e:
+        logging.error(f"Error building recipe name index: {e}", exc_info=True)
+        raise
 
     # 4. Create Retriever
     logging.info("Creating Retriever...")
     try:
-        retriever = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 5})
+        # Over-fetch + MMR diversification with adaptive k (see app/retrieval.py)
+        retriever = MMRRetriever(vectorstore, embedding, k=5)
         logging.info("Retriever created.")
     except Exception as e:
         logging.error(f"Error creating retriever: {e}", exc_info=True)
@@ -126,17 +207,20 @@ def initialize_rag_resources():
     try:
         # Step 1: Structure Extraction Chain
         intent_prompt = PromptTemplate(input_variables=["query"], template=query_clean_prompt()) # Assuming query_clean_prompt returns the template string
-        intent_extraction_chain = LLMChain(llm=llm, prompt=intent_prompt)
+        router.register_stage("intent", intent_prompt)
+        intent_extraction_chain = router.get_chain("intent")
         print(f"intent_extraction_chain: {intent_extraction_chain}")
 
         # Step 2: Query Rewrite Chain
         rewrite_prompt = PromptTemplate(input_variables=["intent", "entities"], template=generate_reconstruct_prompt()) # Assuming generate_reconstruct_prompt returns the template string
-        rewrite_chain = LLMChain(llm=llm, prompt=rewrite_prompt)
+        router.register_stage("rewrite", rewrite_prompt)
+        rewrite_chain = router.get_chain("rewrite")
         print(f"rewrite_chain: {rewrite_chain}")
 
         # Step 3: Final Answer Generation Chain
         final_prompt = PromptTemplate(input_variables=["question", "context", "formatted_history"], template=final_generation_prompt_template())
-        answer_chain = LLMChain(llm=llm, prompt=final_prompt)
+        router.register_stage("answer", final_prompt)
+        answer_chain = router.get_chain("answer")
         print(f"answer_chain: {answer_chain}")
 
         logging.info("LLM Chains created.")
@@ -149,8 +233,9 @@ def initialize_rag_resources():
     return {
         "embedding": embedding,
         "vectorstore": vectorstore,
+        "recipe_name_index": recipe_name_index,
         "retriever": retriever,
-        "llm": llm,
+        "router": router,
         "intent_extraction_chain": intent_extraction_chain,
         "rewrite_chain": rewrite_chain,
         "answer_chain": answer_chain
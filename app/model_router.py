@@ -0,0 +1,102 @@
+# app/model_router.py
+
+import logging
+import time
+
+from langchain.chains import LLMChain
+from langchain_community.callbacks import get_openai_callback
+from langchain_openai import ChatOpenAI
+
+from app.metrics import metrics
+
+
+def openai_llm_factory(model: str, temperature: float, max_tokens: int | None):
+    """Default factory: builds an OpenAI chat model for one route."""
+    return ChatOpenAI(model=model, temperature=temperature, max_tokens=max_tokens)
+
+
+class ModelRouter:
+    """Maps each pipeline stage (and, optionally, each intent) to a configured LLM route.
+
+    Args:
+        routes: Route name -> {"model", "temperature", "max_tokens"}.
+        stage_routes: Stage name -> default route name.
+        intent_routes: Stage name -> {intent -> route name} overrides.
+        llm_factory: Callable(model, temperature, max_tokens) returning a LangChain
+            LLM. Defaults to OpenAI; pass a fake model factory to run offline.
+    """
+
+    def __init__(self, routes: dict, stage_routes: dict, intent_routes: dict | None = None, llm_factory=None):
+        self.routes = routes
+        self.stage_routes = stage_routes
+        self.intent_routes = intent_routes or {}
+        self._llm_factory = llm_factory or openai_llm_factory
+        self._llms = {}
+        self._chains = {}
+
+    def route_for(self, stage: str, intent: str | None = None) -> str:
+        """Returns the route name used for a stage, taking intent overrides into account."""
+        route = self.intent_routes.get(stage, {}).get(intent)
+        return route or self.stage_routes[stage]
+
+    def get_llm(self, route: str):
+        """Returns the LLM for a route, sharing one instance between identically configured routes."""
+        config = self.routes[route]
+        key = (config["model"], config["temperature"], config.get("max_tokens"))
+        if key not in self._llms:
+            logging.info(f"Initializing LLM for route '{route}': {config}")
+            self._llms[key] = self._llm_factory(config["model"], config["temperature"], config.get("max_tokens"))
+        return self._llms[key]
+
+    def register_stage(self, stage: str, prompt):
+        """Builds one chain per route the stage can be routed to."""
+        stage_routes = {self.stage_routes[stage], *self.intent_routes.get(stage, {}).values()}
+        for route in stage_routes:
+            self._chains[(stage, route)] = LLMChain(llm=self.get_llm(route), prompt=prompt)
+
+    def get_chain(self, stage: str, intent: str | None = None):
+        """Returns the chain a stage would use for the given intent."""
+        return self._chains[(stage, self.route_for(stage, intent))]
+
+    def invoke(self, stage: str, inputs: dict, intent: str | None = None) -> dict:
+        """Runs a stage on its routed chain and records latency and token cost for the route."""
+        route, chain, model = self._select(stage, intent)
+        start = time.perf_counter()
+        with get_openai_callback() as cb:
+            try:
+                result = chain.invoke(inputs)
+            except Exception:
+                metrics.record_route_call(route, model, time.perf_counter() - start, error=True)
+                raise
+        self._record(route, model, start, cb)
+        return result
+
+    async def ainvoke(self, stage: str, inputs: dict, intent: str | None = None) -> dict:
+        """Async version of `invoke`; cancelling it (e.g. on a deadline) counts as an error."""
+        route, chain, model = self._select(stage, intent)
+        start = time.perf_counter()
+        with get_openai_callback() as cb:
+            try:
+                result = await chain.ainvoke(inputs)
+            except BaseException:
+                metrics.record_route_call(route, model, time.perf_counter() - start, error=True)
+                raise
+        self._record(route, model, start, cb)
+        return result
+
+    def _select(self, stage: str, intent: str | None):
+        route = self.route_for(stage, intent)
+        model = self.routes[route]["model"]
+        logging.info(f"Routing stage '{stage}' (intent={intent}) to route '{route}' ({model})")
+        return route, self._chains[(stage, route)], model
+
+    @staticmethod
+    def _record(route: str, model: str, start: float, cb):
+        metrics.record_route_call(
+            route,
+            model,
+            time.perf_counter() - start,
+            prompt_tokens=cb.prompt_tokens,
+            completion_tokens=cb.completion_tokens,
+            cost_usd=cb.total_cost,
+        )
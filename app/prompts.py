@@ -111,6 +111,20 @@ Analysis Result (JSON):
 
 
 
+def off_topic_answer_template() -> str:
+    """Returns the canned Markdown answer for queries outside healthy cooking (no LLM call)."""
+    answer = """
+I'm NutriBot, and I can only help with **healthy cooking and nutrition** questions.
+
+Try asking me something like:
+- *"Find me a high-protein vegetarian dinner recipe."*
+- *"What's the nutritional info for chicken tikka masala?"*
+- *"What can I use instead of sugar when baking?"*
+- *"Suggest a 1,500 kcal meal plan for the day."*
+"""
+    return answer.strip()
+
+
 def generate_reconstruct_prompt() -> str:
     """
     Generates a prompt for an LLM to rewrite a user query for semantic search.
@@ -5,16 +5,71 @@ from langchain.prompts import PromptTemplate
 from app.prompts import *
 from langchain.docstore.document import Document
 from app.model_loader import *
-from fastapi import Request
+from app.metrics import metrics
+from app.admission import DeadlineExceeded, remaining_time
 import re
 import json
+import asyncio
 import logging
+import time
+
+
+# --- Per-intent Execution Plans ---
+# "intent" always runs (it selects the plan); "rewrite", "retrieve" and the LLM answer are optional.
+DEFAULT_EXECUTION_PLAN = {
+    "rewrite": True,           # run the query-rewrite LLM call
+    "retrieve": True,          # run recipe retrieval
+    "k": 5,                    # number of documents to retrieve
+    "template_answer": None,   # callable() -> str; answers without the LLM on first turns
+}
+
+# Overrides on top of DEFAULT_EXECUTION_PLAN, keyed by intent from query_clean_prompt
+EXECUTION_PLANS = {
+    "find_recipe": {},
+    "request_meal_plan_idea": {"k": 8},
+    "get_nutritional_info": {"k": 3},
+    "find_healthy_substitute": {"k": 3},
+    "ask_cooking_technique": {"rewrite": False, "retrieve": False},
+    "general_health_cooking_advice": {"rewrite": False, "retrieve": False},
+    "unknown": {"rewrite": False, "retrieve": False, "template_answer": off_topic_answer_template},
+}
+
+# Maximum number of documents pinned by a recipe-name match
+MAX_PINNED_NAME_HITS = 3
+# Intents where the user typically names a specific dish; others never pin name hits
+NAME_LOOKUP_INTENTS = {"get_nutritional_info", "find_recipe"}
+
+# Used when the intent JSON cannot be parsed: still search with the raw query
+PARSE_FAILURE_PLAN = {"rewrite": False}
+
+
+def register_execution_plan(intent: str, **overrides):
+    """Registers (or replaces) the execution plan overrides for an intent."""
+    unknown_keys = set(overrides) - set(DEFAULT_EXECUTION_PLAN)
+    if unknown_keys:
+        raise ValueError(f"Unknown execution plan keys: {sorted(unknown_keys)}")
+    EXECUTION_PLANS[intent] = overrides
+
+
+def get_execution_plan(intent: str, parse_failed: bool = False) -> dict:
+    """Returns the full execution plan for an intent."""
+    overrides = PARSE_FAILURE_PLAN if parse_failed else EXECUTION_PLANS.get(intent, {})
+    return {**DEFAULT_EXECUTION_PLAN, **overrides}
+
+
+async def _invoke_stage(resources: dict, stage: str, inputs: dict, deadline: float | None, intent: str | None = None) -> dict:
+    """Runs a routed LLM stage, cancelling it if the request deadline passes first."""
+    timeout = remaining_time(deadline, stage)
+    try:
+        return await asyncio.wait_for(resources["router"].ainvoke(stage, inputs, intent=intent), timeout=timeout)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"Deadline exceeded during stage '{stage}'.")
 
 
-def _preprocess_user_query(user_query: str, request: Request) -> dict:
-    """Preprocesses the user query using intent extraction and rewriting chains."""
+async def _extract_intent(user_query: str, resources: dict, deadline: float | None = None) -> dict:
+    """Extracts the intent, entities and cleaned query using the intent extraction chain."""
     # Extract intent and entities
-    intent_result = request.app.state.rag_resources["intent_extraction_chain"].invoke({"query": user_query})
+    intent_result = await _invoke_stage(resources, "intent", {"query": user_query}, deadline)
 
     raw_json_str = intent_result["text"]
     logging.info(f"Raw JSON String from intent extraction: {raw_json_str}")
@@ -23,42 +78,87 @@ def _preprocess_user_query(user_query: str, request: Request) -> dict:
         parsed = json.loads(raw_json_str)
     except json.JSONDecodeError as e:
         logging.error(f"Failed to parse JSON from intent extraction: {e}")
-        # Handle error: maybe return a default structure or raise an exception
-        # For now, let's return a structure indicating failure
+        stripped = raw_json_str.strip()
+        if stripped.startswith("{") and not stripped.endswith("}"):
+            # The JSON object was never closed: most likely the output hit the route's max_tokens
+            route = resources["router"].route_for("intent")
+            logging.warning(f"Intent JSON looks truncated ({len(raw_json_str)} chars) for a "
+                            f"{len(user_query)}-char query; route '{route}' has "
+                            f"max_tokens={resources['router'].routes[route].get('max_tokens')}.")
+        # Return a structure indicating failure
         return {
-            "cleaned_query": user_query, # Or None
+            "cleaned_query": user_query,
             "intent": "unknown",
             "entities": {},
-            "semantic_query": user_query # Fallback to original query
+            "parse_failed": True
         }
 
-    # Rewrite the query based on intent and entities for semantic search
-    optimized_query_result = request.app.state.rag_resources["rewrite_chain"].invoke(
+    return {
+        "cleaned_query": parsed.get("cleaned_query", user_query),
+        "intent": parsed.get("intent", "unknown"),
+        "entities": parsed.get("entities", {}),
+        "parse_failed": False
+    }
+
+
+async def _rewrite_query(parsed: dict, resources: dict, deadline: float | None = None) -> str:
+    """Rewrites the query based on intent and entities for semantic search."""
+    optimized_query_result = await _invoke_stage(
+        resources,
+        "rewrite",
         {
             "intent": parsed["intent"],
             "entities": parsed["entities"]
-        }
+        },
+        deadline,
+        intent=parsed["intent"],
     )
 
     optimized_query = optimized_query_result["text"]
     # Clean up the rewritten query (remove fluff, normalize whitespace)
     processed_query = _query_preprocess(optimized_query)
     logging.info(f"Processed Semantic Query: {processed_query}")
-    return {
-        "cleaned_query": parsed["cleaned_query"],
-        "intent": parsed["intent"],
-        "entities": parsed["entities"],
-        "semantic_query": processed_query
-    }
+    return processed_query
+
+
+def _lookup_recipe_names(name_query: str, resources: dict, limit: int) -> list[Document]:
+    """Returns documents whose recipe name appears (exactly or with typos) in the query."""
+    name_index = resources.get("recipe_name_index")
+    if name_index is None or not name_query:
+        return []
 
+    start = time.perf_counter()
+    doc_ids = name_index.lookup(name_query, limit=limit)
+    docstore = resources["vectorstore"].docstore
+    docs = [doc for doc in (docstore.search(doc_id) for doc_id in doc_ids) if isinstance(doc, Document)]
+    logging.info(f"Recipe name lookup found {len(docs)} documents in {(time.perf_counter() - start) * 1e6:.0f}us")
+    return docs
 
-def _retrieve_docs(semantic_query: str, request: Request) -> list[Document]:
-    """Retrieves relevant documents based on the semantic query."""
-    logging.info(f"Retrieving documents for semantic query: {semantic_query}")
+
+def _retrieve_docs(semantic_query: str, resources: dict, k: int = 5, name_query: str | None = None,
+                   intent: str | None = None) -> list[Document]:
+    """Retrieves up to k relevant, diverse documents based on the semantic query.
+
+    For NAME_LOOKUP_INTENTS, recipes named in `name_query` are pinned at the
+    top; vector search only fills the remaining slots and is skipped entirely
+    when names fill all k.
+    """
+    logging.info(f"Retrieving {k} documents for semantic query: {semantic_query}")
     try:
-        # Use the retriever loaded during application startup
-        retrieved_docs = request.app.state.rag_resources["retriever"].invoke(semantic_query) # Use invoke() for newer LangChain versions
-        logging.info(f"Retrieved {len(retrieved_docs)} documents.")
+        pinned_docs = []
+        if intent in NAME_LOOKUP_INTENTS:
+            pinned_docs = _lookup_recipe_names(name_query, resources, MAX_PINNED_NAME_HITS)[:k]
+        remaining = k - len(pinned_docs)
+        if remaining <= 0:
+            logging.info("Recipe name hits fill all slots; skipping vector search.")
+            return pinned_docs
+
+        # Use the MMR retriever loaded during application startup
+        similar_docs = resources["retriever"].invoke(semantic_query, k=k)
+        pinned_names = {doc.metadata.get("recipe_name") for doc in pinned_docs}
+        similar_docs = [doc for doc in similar_docs if doc.metadata.get("recipe_name") not in pinned_names]
+        retrieved_docs = pinned_docs + similar_docs[:remaining]
+        logging.info(f"Retrieved {len(retrieved_docs)} documents ({len(pinned_docs)} pinned by name).")
         return retrieved_docs
     except Exception as e:
         logging.error(f"Error during document retrieval: {e}", exc_info=True)
@@ -130,12 +230,20 @@ def _query_preprocess(query: str) -> str:
 
 
 
-async def full_rag_pipeline(user_query: str, history: list[Message],request: Request) -> dict:
-    """Executes the full RAG pipeline: preprocess, retrieve, generate.
+async def full_rag_pipeline(user_query: str, history: list[Message], resources: dict, deadline: float | None = None) -> dict:
+    """Executes the full RAG pipeline: intent, rewrite, retrieve, generate.
+
+    Which stages run is decided per intent by its execution plan (see EXECUTION_PLANS).
 
     Args:
         user_query: The user's natural language query.
-        request: The FastAPI request object, used to access shared resources.
+        resources: The RAG resource snapshot (router, vectorstore, retriever, ...)
+            pinned for this request.
+        deadline: Optional time.monotonic() deadline; stages are not started (and
+            running LLM calls are cancelled) once it passes.
+
+    Raises:
+        DeadlineExceeded: If the deadline passes before the answer is ready.
 
     Returns:
         A dictionary containing the final answer and potentially intermediate results.
@@ -143,23 +251,49 @@ async def full_rag_pipeline(user_query: str, history: list[Message],request: Req
 
     logging.info(f"--- Starting Full RAG Pipeline for query: '{user_query}' ---")
 
-    # 1. Preprocess Query (Intent Extraction, Rewriting, Cleaning)
-    preprocess_result = _preprocess_user_query(user_query, request)
-    semantic_query = preprocess_result["semantic_query"]
-
-    if not semantic_query:
-        logging.warning("Preprocessing resulted in an empty semantic query. Aborting.")
-        return {"error": "Sorry, I could not process your query after preprocessing.", "final_answer": "Sorry, I could not process your query."} # Return error structure
-
-    logging.info(f"Using Semantic Query for Retrieval: {semantic_query}")
-
-    # 2. Retrieve Documents
-    retrieved_docs = _retrieve_docs(semantic_query, request)
-
-    # 3. Process Retrieved Documents into Context
-    context_string = _process_retrieved_docs(retrieved_docs)
-
-    # 4. Generate Final Answer using LLM with Context
+    # 1. Extract Intent and pick the execution plan for it
+    parsed = await _extract_intent(user_query, resources, deadline)
+    plan = get_execution_plan(parsed["intent"], parse_failed=parsed["parse_failed"])
+    # Template answers are only used on first turns; follow-ups may rely on history
+    use_template = plan["template_answer"] is not None and not history
+    # The rewrite only feeds retrieval, so it never runs without it
+    runs = {"rewrite": plan["rewrite"] and plan["retrieve"], "retrieve": plan["retrieve"], "answer": not use_template}
+    skipped_stages = [stage for stage, run in runs.items() if not run]
+    # Parse failures run their own plan, so they are counted apart from the "unknown" intent
+    metrics.record_plan("parse_failed" if parsed["parse_failed"] else parsed["intent"], skipped_stages)
+    logging.info(f"Execution plan for intent '{parsed['intent']}': {plan}, skipping {skipped_stages}")
+
+    if use_template:
+        logging.info(f"--- Finished Full RAG Pipeline (template answer) ---")
+        return plan["template_answer"]()
+
+    context_string = "No recipe retrieval was performed for this question; answer from general healthy cooking knowledge."
+    if plan["retrieve"]:
+        # 2. Rewrite Query for semantic search (or reuse the cleaned query)
+        if plan["rewrite"]:
+            semantic_query = await _rewrite_query(parsed, resources, deadline)
+        else:
+            semantic_query = _query_preprocess(parsed["cleaned_query"])
+
+        if not semantic_query:
+            logging.warning("Preprocessing resulted in an empty semantic query. Aborting.")
+            return {"error": "Sorry, I could not process your query after preprocessing.", "final_answer": "Sorry, I could not process your query."} # Return error structure
+
+        logging.info(f"Using Semantic Query for Retrieval: {semantic_query}")
+
+        # 3. Retrieve Documents (off the event loop)
+        try:
+            retrieved_docs = await asyncio.wait_for(
+                asyncio.to_thread(_retrieve_docs, semantic_query, resources, plan["k"], parsed["cleaned_query"], parsed["intent"]),
+                timeout=remaining_time(deadline, "retrieve"),
+            )
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("Deadline exceeded during stage 'retrieve'.")
+
+        # 4. Process Retrieved Documents into Context
+        context_string = _process_retrieved_docs(retrieved_docs)
+
+    # 5. Generate Final Answer using LLM with Context
     logging.info(f"Generating final answer using context (length: {len(context_string)} chars)")
 
     formatted_history = ""
@@ -170,13 +304,20 @@ async def full_rag_pipeline(user_query: str, history: list[Message],request: Req
             formatted_history += f"{role.capitalize()}: {content}\n"
 
     try:
-        # Use the final answering chain
-        final_chain = request.app.state.rag_resources["answer_chain"]
-        llm_response = final_chain.invoke({"question": user_query, "context": context_string, "formatted_history": formatted_history})
+        # Use the final answering chain routed by intent
+        llm_response = await _invoke_stage(
+            resources,
+            "answer",
+            {"question": user_query, "context": context_string, "formatted_history": formatted_history},
+            deadline,
+            intent=parsed["intent"],
+        )
         markdown_answer = llm_response["text"]
 
         logging.info("Successfully generated final answer.")
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         logging.error(f"Error during final answer generation: {e}", exc_info=True)
         markdown_answer = "Sorry, an error occurred while generating the final response."
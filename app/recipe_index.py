@@ -0,0 +1,260 @@
+# app/recipe_index.py
+
+import argparse
+import logging
+import random
+import re
+import time
+import unicodedata
+from array import array
+
+import numpy as np
+
+# Minimum share of a name's trigrams that must appear in the query for a fuzzy hit
+FUZZY_MIN_SCORE = 0.7
+# Names shorter than this (normalized) are only matched exactly; trigrams are too noisy for them
+FUZZY_MIN_NAME_LENGTH = 6
+# Trigrams shared by more names than this are too common to generate fuzzy candidates from
+MAX_TRIGRAM_POSTINGS = 1000
+# Candidates are generated from at most this many of the query's rarest trigrams
+CANDIDATE_TRIGRAMS = 8
+# The rarest query trigrams used when fewer than this many are under the cutoff
+MIN_CANDIDATE_TRIGRAMS = 3
+# At most this many candidates (most shared rare trigrams) are re-scored per fuzzy lookup
+FUZZY_CANDIDATES = 8
+# Minimum share of the query's content words a name must cover to be pinned
+MIN_QUERY_COVERAGE = 0.6
+# Minimum content words a pinned name must have (and, for exact hits, cover in the query):
+# one-word names like "Salad" or "Chicken" are categories, not a dish the user asked for
+MIN_NAME_CONTENT_WORDS = 2
+
+# Filler, request and generic meal/diet words. They don't identify a dish, so they are
+# ignored when deciding whether a name hit is specific enough to pin.
+GENERIC_WORDS = frozenset("""
+    a about an and any are as at be best can could do does dish dishes easy food foods for from
+    get give good have how i idea ideas in info information is it me meal meals my need of on
+    or please quick recipe recipes show simple some suggest that the to tell what whats which
+    with without would you want like make cook cooking use using
+    nutrition nutritional nutrient nutrients calorie calories kcal macro macros fact facts
+    healthy healthier health high low protein carb carbs fat sugar diet lunch dinner breakfast
+    brunch snack snacks dessert side
+""".split())
+
+
+def normalize_recipe_name(name: str) -> str:
+    """Lowercases, strips accents and punctuation, and collapses whitespace."""
+    name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    name = re.sub(r"[^a-z0-9]+", " ", name.lower())
+    return name.strip()
+
+
+def _content_words(text: str) -> list[str]:
+    """Returns the words of a normalized string that are not in GENERIC_WORDS."""
+    return [word for word in text.split() if word not in GENERIC_WORDS]
+
+
+def _trigrams(text: str) -> set[str]:
+    """Returns the character trigrams of a normalized string, padded at word edges."""
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class RecipeNameIndex:
+    """In-memory lookup of recipe names to docstore ids.
+
+    Exact lookups use a hash map over normalized names, matched against every
+    word span of the query. Typos fall back to a character-trigram inverted
+    index: candidates come from the query's rare trigrams only (common ones
+    would touch a large share of the catalog), and the best few are re-scored
+    by the share of the name's trigrams found in the query.
+    A hit is only returned when it is specific: the name must have at least
+    MIN_NAME_CONTENT_WORDS non-generic words and cover most of the query's
+    content words, so "a salad recipe" does not pin a recipe called "Salad".
+    Each distinct name is stored once; postings are packed `array('I')` lists.
+    """
+
+    def __init__(self):
+        self._names = []              # name id -> normalized name
+        self._name_ids = {}           # normalized name -> name id
+        self._doc_ids = []            # name id -> docstore id, or tuple of ids for duplicate names
+        self._trigram_counts = array("H")  # name id -> number of distinct trigrams
+        self._postings = {}           # trigram -> array of name ids
+        self._max_name_words = 0
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore) -> "RecipeNameIndex":
+        """Builds the index from the `recipe_name` metadata of a LangChain FAISS docstore."""
+        start = time.perf_counter()
+        index = cls()
+        for doc_id in vectorstore.index_to_docstore_id.values():
+            doc = vectorstore.docstore.search(doc_id)
+            if isinstance(doc, str):  # InMemoryDocstore returns an error message for missing ids
+                continue
+            index.add(doc.metadata.get("recipe_name"), doc_id)
+        logging.info(f"Recipe name index built: {len(index)} names, {len(index._postings)} trigrams "
+                     f"in {time.perf_counter() - start:.2f}s")
+        return index
+
+    def add(self, recipe_name: str | None, doc_id: str):
+        """Adds one document under its recipe name."""
+        if not recipe_name:
+            return
+        name = normalize_recipe_name(recipe_name)
+        if not name:
+            return
+
+        name_id = self._name_ids.get(name)
+        if name_id is not None:
+            existing = self._doc_ids[name_id]
+            self._doc_ids[name_id] = (*existing, doc_id) if isinstance(existing, tuple) else (existing, doc_id)
+            return
+
+        name_id = len(self._names)
+        self._names.append(name)
+        self._name_ids[name] = name_id
+        self._doc_ids.append(doc_id)
+        self._max_name_words = max(self._max_name_words, name.count(" ") + 1)
+
+        trigrams = _trigrams(name)
+        self._trigram_counts.append(min(len(trigrams), 0xFFFF))
+        for trigram in trigrams:
+            postings = self._postings.get(trigram)
+            if postings is None:
+                postings = self._postings[trigram] = array("I")
+            postings.append(name_id)
+
+    def _is_specific(self, name_id: int, query_content: list[str]) -> bool:
+        """True if the name covers several, and most, of the query's content words."""
+        name_content = set(_content_words(self._names[name_id]))
+        covered = sum(1 for word in query_content if word in name_content)
+        return covered >= MIN_NAME_CONTENT_WORDS and covered / len(query_content) >= MIN_QUERY_COVERAGE
+
+    def _exact_name_ids(self, query: str, query_content: list[str]) -> list[int]:
+        """Returns specific names equal to the longest matching word span(s) of the query."""
+        words = query.split()
+        for span_len in range(min(self._max_name_words, len(words)), 0, -1):
+            hits = []
+            for i in range(len(words) - span_len + 1):
+                name_id = self._name_ids.get(" ".join(words[i:i + span_len]))
+                if name_id is not None and name_id not in hits and self._is_specific(name_id, query_content):
+                    hits.append(name_id)
+            if hits:
+                return hits
+        return []
+
+    def _fuzzy_name_ids(self, query_content: list[str], limit: int) -> list[int]:
+        """Returns names whose trigrams mostly match the query's content words, best first."""
+        query_trigrams = _trigrams(" ".join(query_content))
+        postings = sorted(filter(None, map(self._postings.get, query_trigrams)), key=len)
+        if not postings:
+            return []
+
+        # Candidates come from the query's rarest trigrams only; common ones would touch a
+        # large share of the catalog on every lookup
+        rare = [p for p in postings[:CANDIDATE_TRIGRAMS] if len(p) <= MAX_TRIGRAM_POSTINGS]
+        if len(rare) < MIN_CANDIDATE_TRIGRAMS:
+            rare = postings[:MIN_CANDIDATE_TRIGRAMS]
+        rare = [np.frombuffer(p, dtype=np.uint32) for p in rare]
+        candidate_ids, rare_counts = np.unique(np.concatenate(rare), return_counts=True)
+        # Only the names sharing the most rare trigrams (or one fewer) are worth scoring
+        top = int(rare_counts.max())
+        candidates = candidate_ids[rare_counts == top][:FUZZY_CANDIDATES].tolist()
+        if len(candidates) < FUZZY_CANDIDATES and top > 1:
+            candidates += candidate_ids[rare_counts == top - 1][:FUZZY_CANDIDATES - len(candidates)].tolist()
+
+        scored = []
+        for name_id in candidates:
+            name = self._names[name_id]
+            if len(name) < FUZZY_MIN_NAME_LENGTH or len(set(_content_words(name))) < MIN_NAME_CONTENT_WORDS:
+                continue
+            # A trigram of the query is one of the name's iff it is a substring of the padded name
+            padded = f" {name} "
+            count = sum(1 for trigram in query_trigrams if trigram in padded)
+            # The name must be mostly in the query, and must explain most of the query
+            score = count / self._trigram_counts[name_id]
+            if score >= FUZZY_MIN_SCORE and count / len(query_trigrams) >= MIN_QUERY_COVERAGE:
+                # Prefer higher scores, then longer (more specific) names
+                scored.append((score, count, name_id))
+        scored.sort(reverse=True)
+        return [name_id for _, _, name_id in scored[:limit]]
+
+    def lookup(self, query: str, limit: int = 3) -> list[str]:
+        """Returns up to `limit` docstore ids for recipe names found in the query.
+
+        Exact name matches win; otherwise only the single best fuzzy
+        (typo-tolerant) match is used, since near-misses are rarely the dish asked for.
+        One document is returned per name, so duplicates of one dish can't fill
+        every slot.
+        """
+        query = normalize_recipe_name(query or "")
+        query_content = _content_words(query)
+        if not query_content or not self._names:
+            return []
+
+        name_ids = self._exact_name_ids(query, query_content) or self._fuzzy_name_ids(query_content, 1)
+        doc_ids = []
+        for name_id in name_ids:
+            ids = self._doc_ids[name_id]
+            doc_ids.append(ids[0] if isinstance(ids, tuple) else ids)
+        return doc_ids[:limit]
+
+
+def _synthetic_names(count: int, seed: int = 0) -> list[str]:
+    """Generates `count` distinct 2-4 word dish names from a food-like vocabulary."""
+    rng = random.Random(seed)
+    base = ["chicken", "beef", "tofu", "salmon", "lentil", "chickpea", "spinach", "mushroom", "garlic",
+            "lemon", "curry", "masala", "tikka", "stew", "soup", "salad", "roast", "grilled", "baked",
+            "spicy", "sweet", "sour", "honey", "ginger", "coconut", "noodle", "rice", "pasta", "bowl", "wrap"]
+    consonants, vowels = "bcdfghjklmnpqrstvwxyz", "aeiou"
+    # Pronounceable made-up words over the full alphabet, giving a realistic spread of trigrams
+    vocab = base + ["".join(rng.choice(consonants if i % 2 == 0 else vowels) for i in range(rng.randint(4, 9)))
+                    for _ in range(5000)]
+    names = set()
+    while len(names) < count:
+        names.add(" ".join(rng.choice(vocab) for _ in range(rng.randint(2, 4))))
+    return sorted(names)
+
+
+def benchmark(catalog_size: int = 200000, repeats: int = 200, seed: int = 0) -> dict:
+    """Times exact hits, typo hits and misses per lookup on a synthetic catalog."""
+    rng = random.Random(seed)
+    names = _synthetic_names(catalog_size, seed)
+    index = RecipeNameIndex()
+    start = time.perf_counter()
+    for i, name in enumerate(names):
+        index.add(name, str(i))
+    build_s = time.perf_counter() - start
+
+    targets = [rng.choice(names) for _ in range(repeats)]
+    typo = lambda name: "".join(c for i, c in enumerate(name) if i != len(name) // 2)  # drop one letter
+    workloads = {
+        "exact": [f"nutrition of {name}" for name in targets],
+        "typo": [f"nutrition of {typo(name)}" for name in targets],
+        "miss": [f"calories in {rng.choice(targets).split()[0]} with zorblat" for _ in range(repeats)],
+    }
+    results = {"catalog_size": catalog_size, "build_s": build_s}
+    for workload, queries in workloads.items():
+        start = time.perf_counter()
+        hits = sum(1 for query in queries if index.lookup(query))
+        results[workload] = {"us_per_lookup": (time.perf_counter() - start) * 1e6 / len(queries),
+                             "hit_rate": hits / len(queries)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark recipe-name lookups on a synthetic catalog.")
+    parser.add_argument("--catalog-size", type=int, default=200000)
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+    results = benchmark(args.catalog_size, args.repeats)
+    print(f"catalog={results['catalog_size']}  build={results['build_s']:.1f}s")
+    for workload in ("exact", "typo", "miss"):
+        row = results[workload]
+        print(f"{workload:>6}: {row['us_per_lookup']:.1f} us/lookup  hit_rate={row['hit_rate']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
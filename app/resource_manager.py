@@ -0,0 +1,185 @@
+# app/resource_manager.py
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from fastapi import HTTPException
+
+from app.model_loader import index_fingerprint, initialize_rag_resources
+
+# --- Configuration ---
+SMOKE_QUERY = "high-protein chicken dinner recipe"
+# Poll the index files for changes every N seconds (0 disables the watcher)
+INDEX_WATCH_INTERVAL_SECONDS = float(os.getenv("INDEX_WATCH_INTERVAL_SECONDS", "0"))
+# Loads retried when the index files change during a load
+MAX_LOAD_ATTEMPTS = 3
+
+
+class _Snapshot:
+    """One generation of RAG resources plus the number of requests still using it."""
+
+    __slots__ = ("resources", "version", "active", "retired")
+
+    def __init__(self, resources: dict, version: int):
+        self.resources = resources
+        self.version = version
+        self.active = 0
+        self.retired = False
+
+
+def smoke_test(resources: dict):
+    """Verifies freshly built resources: retrieval must return documents and the intent stage must answer."""
+    docs = resources["retriever"].invoke(SMOKE_QUERY)
+    if not docs:
+        raise RuntimeError(f"Smoke query '{SMOKE_QUERY}' returned no documents.")
+    # Called on the chain directly so smoke queries stay out of the per-route metrics
+    result = resources["router"].get_chain("intent").invoke({"query": SMOKE_QUERY})
+    if not result.get("text"):
+        raise RuntimeError("Intent stage returned an empty response to the smoke query.")
+    logging.info(f"Smoke test passed: {len(docs)} documents retrieved.")
+
+
+def _changed_during_load(before: tuple, after: tuple) -> bool:
+    """True if an index file that existed before a load was replaced during it.
+
+    Files missing beforehand (None) were downloaded by the loader itself, e.g.
+    on a fresh container, so they don't count as a change.
+    """
+    return any(old is not None and old != new for old, new in zip(before, after))
+
+
+class RAGResourceManager:
+    """Owns the live RAG resources and swaps in new ones without a restart.
+
+    Requests take the current snapshot with `acquire()` and keep it until they
+    finish, so a reload never changes resources under an in-flight request.
+    A new snapshot is built and smoke-tested in a worker thread, swapped in
+    atomically, and the old one is released once its last request completes.
+    All bookkeeping runs on the event loop thread.
+    """
+
+    def __init__(self, loader=initialize_rag_resources, verifier=smoke_test, fingerprint=index_fingerprint):
+        self._loader = loader
+        self._verifier = verifier
+        self._index_fingerprint = fingerprint
+        self._current = None
+        self._retired = []
+        self._reload_lock = asyncio.Lock()
+        self._reload_task = None
+        self._fingerprint = None
+        self.last_reload = None
+
+    @property
+    def is_reloading(self) -> bool:
+        return self._reload_lock.locked() or (self._reload_task is not None and not self._reload_task.done())
+
+    @contextmanager
+    def acquire(self):
+        """Yields the current resources dict, pinned for the duration of the request."""
+        snapshot = self._current
+        if snapshot is None:
+            raise HTTPException(status_code=503, detail="RAG resources are not loaded yet.", headers={"Retry-After": "5"})
+        snapshot.active += 1
+        try:
+            yield snapshot.resources
+        finally:
+            snapshot.active -= 1
+            if snapshot.retired and snapshot.active == 0:
+                self._release(snapshot)
+
+    async def reload(self, reason: str = "manual"):
+        """Builds, verifies and swaps in a new snapshot. Raises (keeping the old one) on failure."""
+        async with self._reload_lock:
+            start = time.monotonic()
+            logging.info(f"--- Reloading RAG resources ({reason}) ---")
+            fingerprint = None
+            try:
+                # Reuse the loaded embedding model; only the index and chains are rebuilt
+                embedding = self._current.resources.get("embedding") if self._current else None
+                for attempt in range(1, MAX_LOAD_ATTEMPTS + 1):
+                    # Taken before loading: if the files are replaced mid-load, the stored
+                    # fingerprint is stale and the watcher picks the new files up
+                    fingerprint = await asyncio.to_thread(self._index_fingerprint)
+                    resources = await asyncio.to_thread(self._loader, embedding=embedding)
+                    embedding = resources.get("embedding", embedding)
+                    loaded = await asyncio.to_thread(self._index_fingerprint)
+                    if not _changed_during_load(fingerprint, loaded):
+                        fingerprint = loaded
+                        break
+                    logging.warning(f"Index files changed while loading (attempt {attempt}/{MAX_LOAD_ATTEMPTS}).")
+                await asyncio.to_thread(self._verifier, resources)
+            except Exception as e:
+                logging.error(f"RAG resource reload failed; keeping version "
+                              f"{self._current.version if self._current else None}: {e}", exc_info=True)
+                self.last_reload = {"reason": reason, "ok": False, "error": str(e), "finished_at": time.time()}
+                # Don't let the watcher retry the same broken files; wait for them to change again
+                if fingerprint is not None:
+                    self._fingerprint = fingerprint
+                raise
+
+            old = self._current
+            self._current = _Snapshot(resources, old.version + 1 if old else 1)
+            self._fingerprint = fingerprint
+            if old is not None:
+                old.retired = True
+                if old.active == 0:
+                    self._release(old)
+                else:
+                    self._retired.append(old)
+
+            self.last_reload = {"reason": reason, "ok": True, "version": self._current.version,
+                                "duration_s": time.monotonic() - start, "finished_at": time.time()}
+            logging.info(f"--- RAG resources version {self._current.version} live "
+                         f"({self.last_reload['duration_s']:.1f}s) ---")
+
+    def schedule_reload(self, reason: str) -> bool:
+        """Starts a background reload. Returns False if one is already running."""
+        if self.is_reloading:
+            return False
+
+        async def _reload():
+            try:
+                await self.reload(reason=reason)
+            except Exception:
+                pass  # Already logged; the old resources stay live
+
+        self._reload_task = asyncio.create_task(_reload())
+        return True
+
+    def _release(self, snapshot: _Snapshot):
+        """Drops the manager's references to a retired snapshot so its index memory can be freed.
+
+        The resources dict itself is left intact: a worker thread abandoned at a
+        deadline may still be using it, and frees it when it finishes.
+        """
+        if snapshot in self._retired:
+            self._retired.remove(snapshot)
+        snapshot.resources = None
+        logging.info(f"Released RAG resources version {snapshot.version}.")
+
+    async def watch_index(self, interval_s: float = INDEX_WATCH_INTERVAL_SECONDS):
+        """Reloads whenever the index files change. Runs until cancelled."""
+        logging.info(f"Watching FAISS index for changes every {interval_s}s.")
+        while True:
+            await asyncio.sleep(interval_s)
+            try:
+                fingerprint = await asyncio.to_thread(self._index_fingerprint)
+                if fingerprint != self._fingerprint and not self.is_reloading:
+                    await self.reload(reason="index changed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Index watch iteration failed: {e}")
+
+    def status(self) -> dict:
+        """Returns the live version, reload state and retired snapshots still draining."""
+        return {
+            "version": self._current.version if self._current else None,
+            "active_requests": self._current.active if self._current else 0,
+            "reloading": self.is_reloading,
+            "draining": [{"version": s.version, "active_requests": s.active} for s in self._retired],
+            "last_reload": self.last_reload,
+        }
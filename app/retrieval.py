@@ -0,0 +1,154 @@
+# app/retrieval.py
+
+import argparse
+import logging
+import os
+import time
+
+import faiss
+import numpy as np
+from langchain.docstore.document import Document
+
+# --- Configuration ---
+MMR_FETCH_K = int(os.getenv("MMR_FETCH_K", "25"))            # candidates over-fetched from FAISS
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.6"))           # 1.0 = pure relevance, 0.0 = pure diversity
+ADAPTIVE_K_MIN = int(os.getenv("ADAPTIVE_K_MIN", "2"))
+ADAPTIVE_K_MARGIN = float(os.getenv("ADAPTIVE_K_MARGIN", "0.15"))  # max cosine drop from the best candidate
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def adaptive_k(sorted_scores: np.ndarray, k_max: int, k_min: int = ADAPTIVE_K_MIN,
+               margin: float = ADAPTIVE_K_MARGIN) -> int:
+    """Picks k from a descending score distribution.
+
+    Keeps every candidate within `margin` of the best score, clamped to
+    [k_min, k_max]: a clear winner yields few documents, a flat distribution
+    yields up to k_max.
+    """
+    if len(sorted_scores) == 0:
+        return 0
+    k = int(np.count_nonzero(sorted_scores >= sorted_scores[0] - margin))
+    return max(min(k, k_max), min(k_min, k_max, len(sorted_scores)))
+
+
+def mmr_select(query_vector: np.ndarray, candidate_vectors: np.ndarray, k: int,
+               lambda_mult: float = MMR_LAMBDA) -> tuple[np.ndarray, np.ndarray]:
+    """Selects `k` candidates by maximal marginal relevance.
+
+    Cosine similarities are computed once as matrix products; each of the k
+    selection steps is a vectorized update of the running max-similarity to
+    the selected set, so there is no per-document Python loop.
+
+    Returns:
+        (selected candidate indices in selection order, relevance of every candidate)
+    """
+    candidates = _normalize_rows(np.asarray(candidate_vectors, dtype=np.float32))
+    query = _normalize_rows(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))
+    relevance = (candidates @ query.T).ravel()
+
+    k = min(k, len(candidates))
+    selected = np.empty(k, dtype=np.int64)
+    if k == 0:
+        return selected, relevance
+
+    pairwise = candidates @ candidates.T
+    selected[0] = int(np.argmax(relevance))
+    max_similarity = pairwise[selected[0]].copy()
+    scores = np.empty_like(relevance)
+    taken = np.zeros(len(candidates), dtype=bool)
+    taken[selected[0]] = True
+    for i in range(1, k):
+        np.multiply(relevance, lambda_mult, out=scores)
+        scores -= (1 - lambda_mult) * max_similarity
+        scores[taken] = -np.inf
+        best = int(np.argmax(scores))
+        selected[i] = best
+        taken[best] = True
+        np.maximum(max_similarity, pairwise[best], out=max_similarity)
+    return selected, relevance
+
+
+class MMRRetriever:
+    """Retriever over a LangChain FAISS vectorstore with MMR diversification and adaptive k.
+
+    Over-fetches `fetch_k` nearest neighbours, diversifies them with MMR,
+    then trims the selection to an adaptive k picked from their relevance.
+    """
+
+    def __init__(self, vectorstore, embedding, k: int = 5, fetch_k: int = MMR_FETCH_K,
+                 lambda_mult: float = MMR_LAMBDA, adaptive: bool = True):
+        self.vectorstore = vectorstore
+        self.embedding = embedding
+        self.k = k
+        self.fetch_k = fetch_k
+        self.lambda_mult = lambda_mult
+        self.adaptive = adaptive
+
+    def invoke(self, query: str, k: int | None = None) -> list:
+        """Returns up to k diverse documents for the query (fewer when relevance drops off)."""
+        k = k or self.k
+        index = self.vectorstore.index
+        query_vector = np.asarray(self.embedding.embed_query(query), dtype=np.float32).reshape(1, -1)
+
+        _, ids = index.search(query_vector, max(self.fetch_k, k))
+        ids = ids[0][ids[0] >= 0]
+        if len(ids) == 0:
+            return []
+
+        start = time.perf_counter()
+        candidate_vectors = index.reconstruct_batch(ids)
+        selected, relevance = mmr_select(query_vector, candidate_vectors, k, self.lambda_mult)
+        if self.adaptive:
+            # MMR picks greedily, so the first k' of a k-selection is the k'-selection
+            selected = selected[:adaptive_k(np.sort(relevance)[::-1], k)]
+        logging.info(f"MMR selected {len(selected)} of {len(ids)} candidates in "
+                     f"{(time.perf_counter() - start) * 1e6:.0f}us")
+
+        docstore = self.vectorstore.docstore
+        index_to_docstore_id = self.vectorstore.index_to_docstore_id
+        docs = [docstore.search(index_to_docstore_id[int(ids[i])]) for i in selected]
+        # InMemoryDocstore returns an error message string for ids it doesn't have
+        return [doc for doc in docs if isinstance(doc, Document)]
+
+
+def benchmark(fetch_ks=(25, 50, 100), dim: int = 384, k: int = 5, repeats: int = 2000,
+              num_vectors: int = 20000, seed: int = 0) -> list[dict]:
+    """Times candidate reconstruction + MMR + adaptive k per query (excludes embedding and FAISS search).
+
+    Candidate vectors are reconstructed from a real flat index of `num_vectors`
+    random vectors, as `MMRRetriever.invoke` does.
+    """
+    rng = np.random.default_rng(seed)
+    index = faiss.IndexFlatL2(dim)
+    index.add(rng.normal(size=(num_vectors, dim)).astype(np.float32))
+    results = []
+    for fetch_k in fetch_ks:
+        query = rng.normal(size=dim).astype(np.float32)
+        id_sets = [rng.choice(num_vectors, size=fetch_k, replace=False) for _ in range(repeats)]
+        start = time.perf_counter()
+        for ids in id_sets:
+            candidates = index.reconstruct_batch(ids)
+            selected, relevance = mmr_select(query, candidates, k)
+            selected = selected[:adaptive_k(np.sort(relevance)[::-1], k)]
+        results.append({"fetch_k": fetch_k, "dim": dim, "k": k,
+                        "us_per_query": (time.perf_counter() - start) * 1e6 / repeats})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark candidate reconstruction + MMR + adaptive k overhead per query.")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=2000)
+    parser.add_argument("--num-vectors", type=int, default=20000)
+    args = parser.parse_args()
+    for row in benchmark(dim=args.dim, k=args.k, repeats=args.repeats, num_vectors=args.num_vectors):
+        print(f"fetch_k={row['fetch_k']:>4}  dim={row['dim']}  k={row['k']}  {row['us_per_query']:.1f} us/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,53 @@
 from fastapi import APIRouter, Request, HTTPException
 from app.schemas import QueryRequest  # Import the request model
 from app.rag_chain import full_rag_pipeline # Import the main RAG pipeline function
+from app.metrics import metrics
+from app.admission import DeadlineExceeded, FRONTEND_TOKEN, TRUSTED_PROXIES
+import hmac
 import logging # Import logging
+import os
 
 router = APIRouter()
 
+def _tokens_match(supplied: str, expected: str) -> bool:
+    """Constant-time comparison that also accepts non-ASCII header values."""
+    return hmac.compare_digest(supplied.encode(), expected.encode())
+
+
+def _client_ip(request: Request) -> str:
+    """Returns the caller's IP: the peer address, or the nearest untrusted X-Forwarded-For hop behind trusted proxies."""
+    peer = request.client.host if request.client else "anonymous"
+    if peer not in TRUSTED_PROXIES:
+        return peer
+    hops = [hop.strip() for hop in request.headers.get("X-Forwarded-For", "").split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if hop not in TRUSTED_PROXIES:
+            return hop
+    return peer
+
+
+def _client_id(request: Request) -> str:
+    """Identifies the caller for rate limiting.
+
+    X-Client-ID is only honoured from the trusted frontend (X-Frontend-Token
+    matching FRONTEND_TOKEN), which forwards one id per chat session; anyone
+    else is identified by IP so changing headers can't reset their bucket.
+    """
+    session_id = request.headers.get("X-Client-ID")
+    frontend_token = request.headers.get("X-Frontend-Token", "")
+    if session_id and FRONTEND_TOKEN and _tokens_match(frontend_token, FRONTEND_TOKEN):
+        return f"session:{session_id}"
+    return f"ip:{_client_ip(request)}"
+
+
+def _requested_timeout(request: Request) -> float | None:
+    """Reads the client's own timeout (seconds) so work stops once the client gives up."""
+    try:
+        return float(request.headers["X-Request-Timeout"])
+    except (KeyError, ValueError):
+        return None
+
+
 @router.post("/recommend")  # 更改路由路径
 async def recommend_text(req: QueryRequest, request: Request): # 使用新的请求模型
 
@@ -18,9 +61,49 @@ async def recommend_text(req: QueryRequest, request: Request): # 使用新的请
         print(f"{msg.role}: {msg.content}")
     print("------------------------")
 
-    markdown_response = await full_rag_pipeline(req.query, req.history, request) # 取消调用注释
+    admission = request.app.state.admission
+    deadline = admission.deadline_for(_requested_timeout(request))
+    async with admission.admit(_client_id(request), deadline):
+        try:
+            # Pin the current resource snapshot so a hot reload can't swap it mid-request
+            with request.app.state.rag_manager.acquire() as resources:
+                markdown_response = await full_rag_pipeline(req.query, req.history, resources, deadline=deadline)
+        except DeadlineExceeded as e:
+            admission.record_shed("deadline_expired")
+            logging.warning(f"Abandoning request: {e}")
+            raise HTTPException(status_code=503, detail="Request deadline exceeded. Please retry.", headers={"Retry-After": "1"})
     
     return {
         "message": "成功收到请求 ✅",
         "markdown_response": markdown_response
     }
+
+
+@router.get("/metrics")
+async def get_metrics(request: Request):
+    """Returns per-route LLM latency/token cost, per-intent stage skips and admission counters."""
+    return {**metrics.snapshot(), "admission": request.app.state.admission.snapshot()}
+
+
+def _check_admin_token(request: Request):
+    """Admin routes are disabled unless ADMIN_TOKEN is set, and require it in X-Admin-Token."""
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token or not _tokens_match(request.headers.get("X-Admin-Token", ""), admin_token):
+        raise HTTPException(status_code=403, detail="Admin access denied.")
+
+
+@router.post("/admin/reload", status_code=202)
+async def reload_resources(request: Request):
+    """Rebuilds the index, retriever and chains in the background and swaps them in when verified."""
+    _check_admin_token(request)
+    manager = request.app.state.rag_manager
+    if not manager.schedule_reload(reason="admin"):
+        raise HTTPException(status_code=409, detail="A reload is already in progress.")
+    return {"message": "Reload started.", **manager.status()}
+
+
+@router.get("/admin/reload")
+async def reload_status(request: Request):
+    """Returns the live resource version and the outcome of the last reload."""
+    _check_admin_token(request)
+    return request.app.state.rag_manager.status()
@@ -1,8 +1,11 @@
 import streamlit as st
 import requests
 import os
+import uuid
 
 POST_URL = 'http://app:8000/'
+# Shared secret that lets the backend rate-limit per chat session instead of per frontend server
+FRONTEND_TOKEN = os.getenv("FRONTEND_TOKEN", "")
 # POST_URL = 'http://localhost:8000/'
 
 st.set_page_config(page_title="NutriBot 🍽️", page_icon="🥦")
@@ -10,6 +13,10 @@ st.title("🥦 NutriBot: Your Nutrition Assistant")
 
 st.caption("Ask me anything about healthy cooking, recipes, or nutritional info!")
 
+# Stable id for this chat session, used by the backend for per-user rate limiting
+if "client_id" not in st.session_state:
+    st.session_state.client_id = str(uuid.uuid4())
+
 # Initialize message history
 if "messages" not in st.session_state:
     st.session_state.messages = [{"role": "assistant", "content": "Hi! How can I help you with your healthy eating today?"}]
@@ -37,12 +44,16 @@ if prompt := st.chat_input("What would you like to know?"):
 
         with assistant_placeholder.container():
             with st.spinner("NutriBot is thinking..."):
-                response = requests.post(f"{POST_URL}/recommend", json=payload)
+                headers = {"X-Client-ID": st.session_state.client_id, "X-Frontend-Token": FRONTEND_TOKEN}
+                response = requests.post(f"{POST_URL}/recommend", json=payload, headers=headers)
                 if response.status_code == 200:
                     result = response.json()
                     reply = result.get('markdown_response', 'Sorry, I could not process your request.')
                 elif response.status_code == 422:
                     reply = f"❌ Input Error: {response.json().get('detail', 'Invalid input')}"
+                elif response.status_code in (429, 503):
+                    retry_after = response.headers.get("Retry-After", "a few")
+                    reply = f"⏳ NutriBot is busy right now. Please try again in {retry_after} seconds."
                 else:
                     reply = f"❌ Error from backend: {response.status_code} - {response.text}"
 
@@ -0,0 +1,133 @@
+# tests/test_admission.py
+
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import app.routes as routes
+from app.admission import AdmissionController, DeadlineExceeded, remaining_time
+
+
+def make_request(headers: dict | None = None, peer: str = "10.0.0.1") -> Request:
+    raw_headers = [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    return Request({"type": "http", "headers": raw_headers, "client": (peer, 12345)})
+
+
+async def hold(controller: AdmissionController, client_id: str, release: asyncio.Event, deadline_s: float = 5):
+    async with controller.admit(client_id, time.monotonic() + deadline_s):
+        await release.wait()
+
+
+def test_rate_limit_is_off_by_default():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, max_queue=0)
+        for _ in range(20):
+            async with controller.admit("ip:frontend", time.monotonic() + 1):
+                pass
+        return controller.snapshot()
+
+    snapshot = asyncio.run(scenario())
+    assert snapshot["admitted"] == 20
+    assert snapshot["shed"] == {}
+
+
+def test_rate_limit_rejects_with_retry_after():
+    async def scenario():
+        controller = AdmissionController(rate_per_minute=60, burst=2)
+        for _ in range(2):
+            async with controller.admit("ip:a", time.monotonic() + 1):
+                pass
+        with pytest.raises(HTTPException) as exc_info:
+            async with controller.admit("ip:a", time.monotonic() + 1):
+                pass
+        # Other clients have their own bucket
+        async with controller.admit("ip:b", time.monotonic() + 1):
+            pass
+        return exc_info.value
+
+    error = asyncio.run(scenario())
+    assert error.status_code == 429
+    assert int(error.headers["Retry-After"]) >= 1
+
+
+def test_queue_full_sheds_without_spending_rate_budget():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, max_queue=0, rate_per_minute=60, burst=1)
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(controller, "ip:holder", release))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as exc_info:
+            async with controller.admit("ip:a", time.monotonic() + 1):
+                pass
+        release.set()
+        await holder
+        # The shed request didn't use ip:a's only token, so its retry is admitted
+        async with controller.admit("ip:a", time.monotonic() + 1):
+            pass
+        return exc_info.value, controller.snapshot()
+
+    error, snapshot = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert "Retry-After" in error.headers
+    assert snapshot["shed"] == {"queue_full": 1}
+    assert snapshot["admitted"] == 2
+
+
+def test_deadline_in_queue_sheds_and_refunds_the_token():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, max_queue=1, rate_per_minute=60, burst=1)
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(controller, "ip:holder", release))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as exc_info:
+            async with controller.admit("ip:a", time.monotonic() + 0.05):
+                pass
+        queue_depth = controller.snapshot()["queue_depth"]
+        release.set()
+        await holder
+        async with controller.admit("ip:a", time.monotonic() + 1):
+            pass
+        return exc_info.value, queue_depth, controller.snapshot()
+
+    error, queue_depth, snapshot = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert queue_depth == 0
+    assert snapshot["shed"] == {"deadline_in_queue": 1}
+    assert snapshot["in_flight"] == 0
+
+
+def test_deadline_is_capped_at_the_default_budget():
+    controller = AdmissionController(default_deadline_s=10)
+    now = time.monotonic()
+    assert controller.deadline_for(None) == pytest.approx(now + 10, abs=0.5)
+    assert controller.deadline_for(2) == pytest.approx(now + 2, abs=0.5)
+    assert controller.deadline_for(60) == pytest.approx(now + 10, abs=0.5)
+
+
+def test_remaining_time():
+    assert remaining_time(None, "answer") is None
+    assert 0 < remaining_time(time.monotonic() + 5, "answer") <= 5
+    with pytest.raises(DeadlineExceeded):
+        remaining_time(time.monotonic() - 1, "answer")
+
+
+def test_client_id_ignores_session_ids_without_the_frontend_token(monkeypatch):
+    monkeypatch.setattr(routes, "FRONTEND_TOKEN", "secret")
+    assert routes._client_id(make_request({"X-Client-ID": "s1"})) == "ip:10.0.0.1"
+    assert routes._client_id(make_request({"X-Client-ID": "s1", "X-Frontend-Token": "wrong"})) == "ip:10.0.0.1"
+    assert routes._client_id(make_request({"X-Client-ID": "s1", "X-Frontend-Token": "secret"})) == "session:s1"
+
+
+def test_client_id_uses_ip_when_no_frontend_token_is_configured(monkeypatch):
+    monkeypatch.setattr(routes, "FRONTEND_TOKEN", None)
+    assert routes._client_id(make_request({"X-Client-ID": "s1", "X-Frontend-Token": ""})) == "ip:10.0.0.1"
+
+
+def test_forwarded_for_is_only_trusted_from_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(routes, "TRUSTED_PROXIES", {"10.0.0.1"})
+    forwarded = {"X-Forwarded-For": "1.2.3.4, 10.0.0.1"}
+    assert routes._client_ip(make_request(forwarded, peer="10.0.0.1")) == "1.2.3.4"
+    assert routes._client_ip(make_request(forwarded, peer="5.6.7.8")) == "5.6.7.8"
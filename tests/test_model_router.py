@@ -0,0 +1,108 @@
+# tests/test_model_router.py
+
+import pytest
+from langchain.prompts import PromptTemplate
+from langchain_community.llms.fake import FakeListLLM
+
+import app.model_router as model_router
+from app.metrics import PipelineMetrics
+from app.model_loader import INTENT_ROUTES, MODEL_ROUTES, STAGE_ROUTES
+from app.model_router import ModelRouter
+
+
+class FailingLLM(FakeListLLM):
+    """Fake model whose every call fails."""
+
+    def _call(self, *args, **kwargs):
+        raise RuntimeError("model unavailable")
+
+
+def fake_factory(created):
+    """Returns an llm_factory that answers with the model name and records each model it builds."""
+    def factory(model, temperature, max_tokens):
+        created.append((model, temperature, max_tokens))
+        return FakeListLLM(responses=[model])
+    return factory
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    fresh = PipelineMetrics()
+    monkeypatch.setattr(model_router, "metrics", fresh)
+    return fresh
+
+
+@pytest.fixture
+def router():
+    router = ModelRouter(MODEL_ROUTES, STAGE_ROUTES, INTENT_ROUTES, llm_factory=fake_factory([]))
+    prompt = PromptTemplate(input_variables=["query"], template="{query}")
+    for stage in STAGE_ROUTES:
+        router.register_stage(stage, prompt)
+    return router
+
+
+def test_route_for_uses_stage_defaults(router):
+    assert router.route_for("intent") == "extract"
+    assert router.route_for("rewrite") == "rewrite"
+    assert router.route_for("answer") == "answer"
+    assert router.route_for("answer", intent="find_recipe") == "answer"
+
+
+@pytest.mark.parametrize("intent", sorted(INTENT_ROUTES["answer"]))
+def test_route_for_applies_answer_intent_overrides(router, intent):
+    assert router.route_for("answer", intent=intent) == INTENT_ROUTES["answer"][intent]
+    # Overrides only apply to the stage they are configured for
+    assert router.route_for("intent", intent=intent) == "extract"
+
+
+@pytest.mark.parametrize("stage", ["intent", "rewrite"])
+def test_json_and_rewrite_stages_run_at_temperature_zero(router, stage):
+    assert router.routes[router.route_for(stage)]["temperature"] == 0
+
+
+def test_invoke_runs_the_routed_model(router, metrics):
+    assert router.invoke("answer", {"query": "q"}, intent="find_recipe")["text"] == MODEL_ROUTES["answer"]["model"]
+    assert router.invoke("answer", {"query": "q"}, intent="unknown")["text"] == MODEL_ROUTES["answer_light"]["model"]
+
+
+def test_identical_route_configs_share_one_llm():
+    created = []
+    config = {"model": "fast", "temperature": 0.0, "max_tokens": 100}
+    router = ModelRouter(
+        {"a": dict(config), "b": dict(config), "c": {**config, "temperature": 0.7}},
+        {"first": "a", "second": "b", "third": "c"},
+        llm_factory=fake_factory(created),
+    )
+
+    assert router.get_llm("a") is router.get_llm("b")
+    assert router.get_llm("a") is not router.get_llm("c")
+    assert created == [("fast", 0.0, 100), ("fast", 0.7, 100)]
+
+
+def test_invoke_records_calls_per_route(router, metrics):
+    router.invoke("intent", {"query": "q"})
+    router.invoke("intent", {"query": "q"})
+    router.invoke("answer", {"query": "q"}, intent="unknown")
+
+    routes = metrics.snapshot()["routes"]
+    assert routes["extract"]["calls"] == 2
+    assert routes["extract"]["errors"] == 0
+    assert routes["extract"]["model"] == MODEL_ROUTES["extract"]["model"]
+    assert routes["answer_light"]["calls"] == 1
+    assert "answer" not in routes
+
+
+def test_invoke_records_errors_and_reraises(metrics):
+    router = ModelRouter(
+        {"broken": {"model": "broken", "temperature": 0.0, "max_tokens": 10}},
+        {"answer": "broken"},
+        llm_factory=lambda model, temperature, max_tokens: FailingLLM(responses=[""]),
+    )
+    router.register_stage("answer", PromptTemplate(input_variables=["query"], template="{query}"))
+
+    with pytest.raises(RuntimeError):
+        router.invoke("answer", {"query": "q"})
+
+    stats = metrics.snapshot()["routes"]["broken"]
+    assert stats["calls"] == 1
+    assert stats["errors"] == 1
@@ -0,0 +1,70 @@
+# tests/test_recipe_index.py
+
+import pytest
+
+from app.recipe_index import RecipeNameIndex, normalize_recipe_name
+
+
+@pytest.fixture
+def index():
+    index = RecipeNameIndex()
+    for name, doc_id in [
+        ("Salad", "salad"),
+        ("Chicken", "chicken"),
+        ("Chicken Tikka Masala", "tikka-1"),
+        ("chicken tikka masala", "tikka-2"),
+        ("Chicken Tikka Masala!", "tikka-3"),
+        ("Greek Salad", "greek"),
+        ("Crème Brûlée", "creme"),
+        ("Lemon Garlic Salmon", "salmon"),
+    ]:
+        index.add(name, doc_id)
+    return index
+
+
+def test_normalize_strips_accents_case_and_punctuation():
+    assert normalize_recipe_name("  Crème-Brûlée (Classic)! ") == "creme brulee classic"
+
+
+def test_duplicate_names_are_stored_once(index):
+    assert len(index) == 6
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("nutrition of chicken tikka masala", ["tikka-1"]),
+    ("How many calories in a Greek salad?", ["greek"]),
+    ("creme brulee recipe", ["creme"]),
+])
+def test_exact_name_hits(index, query, expected):
+    assert index.lookup(query) == expected
+
+
+def test_duplicate_names_pin_one_document(index):
+    assert index.lookup("chicken tikka masala", limit=3) == ["tikka-1"]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("calories in chiken tika masala", ["tikka-1"]),
+    ("lemon garlik salmon please", ["salmon"]),
+])
+def test_typos_fall_back_to_the_best_fuzzy_hit(index, query, expected):
+    assert index.lookup(query) == expected
+
+
+@pytest.mark.parametrize("query", [
+    "a salad recipe",
+    "a recipe with chicken",
+    "a chickn recipe",
+    "a high protein breakfast",
+    "",
+])
+def test_category_and_generic_queries_pin_nothing(index, query):
+    assert index.lookup(query) == []
+
+
+def test_name_must_cover_most_of_the_query(index):
+    assert index.lookup("greek salad with quinoa feta olives and cucumber") == []
+
+
+def test_unrelated_query_misses(index):
+    assert index.lookup("vegan zorblat stew") == []
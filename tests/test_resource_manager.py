@@ -0,0 +1,154 @@
+# tests/test_resource_manager.py
+
+import asyncio
+import logging
+
+import pytest
+from fastapi import HTTPException
+from langchain.prompts import PromptTemplate
+from langchain_community.llms.fake import FakeListLLM
+
+import app.model_router as model_router
+from app.metrics import PipelineMetrics
+from app.model_router import ModelRouter
+from app.resource_manager import RAGResourceManager, smoke_test
+
+
+class FakeIndexFiles:
+    """Index files on 'disk' plus a loader that downloads them when missing, like initialize_rag_resources."""
+
+    def __init__(self, present: bool = True):
+        self.files = {"index.faiss": (1, 100), "index.pkl": (1, 10)} if present else {}
+        self.loads = []
+        self.replace_during_load = 0
+
+    def fingerprint(self) -> tuple:
+        return tuple(self.files.get(name) for name in ("index.faiss", "index.pkl"))
+
+    def replace(self):
+        self.files = {name: (mtime + 1, size) for name, (mtime, size) in self.files.items()}
+
+    def loader(self, embedding=None):
+        if not self.files:
+            self.files = {"index.faiss": (1, 100), "index.pkl": (1, 10)}
+        if self.replace_during_load:
+            self.replace_during_load -= 1
+            self.replace()
+        self.loads.append(embedding)
+        return {"embedding": embedding or "embedding", "generation": len(self.loads)}
+
+
+def make_manager(files: FakeIndexFiles, verifier=lambda resources: None) -> RAGResourceManager:
+    return RAGResourceManager(loader=files.loader, verifier=verifier, fingerprint=files.fingerprint)
+
+
+def test_acquire_before_the_first_load_is_a_503():
+    manager = make_manager(FakeIndexFiles())
+    with pytest.raises(HTTPException) as exc_info:
+        with manager.acquire():
+            pass
+    assert exc_info.value.status_code == 503
+
+
+def test_cold_start_download_loads_once(caplog):
+    files = FakeIndexFiles(present=False)
+    manager = make_manager(files)
+
+    with caplog.at_level(logging.WARNING):
+        asyncio.run(manager.reload("startup"))
+
+    assert len(files.loads) == 1
+    assert "changed while loading" not in caplog.text
+    assert manager._fingerprint == files.fingerprint()
+    assert manager.status()["version"] == 1
+
+
+def test_files_replaced_during_load_are_loaded_again():
+    files = FakeIndexFiles()
+    files.replace_during_load = 1
+    manager = make_manager(files)
+
+    asyncio.run(manager.reload("startup"))
+
+    assert len(files.loads) == 2
+    # The second load reuses the embedding model from the first
+    assert files.loads == [None, "embedding"]
+    assert manager._fingerprint == files.fingerprint()
+
+
+def test_reload_swaps_without_touching_pinned_resources():
+    files = FakeIndexFiles()
+    manager = make_manager(files)
+
+    async def scenario():
+        await manager.reload("startup")
+        with manager.acquire() as old:
+            files.replace()
+            await manager.reload("index changed")
+            # The in-flight request keeps its snapshot, intact, until it finishes
+            assert old["generation"] == 1
+            assert manager.status()["draining"] == [{"version": 1, "active_requests": 1}]
+            with manager.acquire() as new:
+                assert new["generation"] == 2
+        assert old == {"embedding": "embedding", "generation": 1}
+        return manager.status()
+
+    status = asyncio.run(scenario())
+    assert status["version"] == 2
+    assert status["draining"] == []
+
+
+def test_failed_verification_keeps_the_old_version():
+    files = FakeIndexFiles()
+    calls = []
+
+    def verifier(resources):
+        calls.append(resources["generation"])
+        if len(calls) > 1:
+            raise RuntimeError("smoke test failed")
+
+    manager = make_manager(files, verifier)
+
+    async def scenario():
+        await manager.reload("startup")
+        files.replace()
+        with pytest.raises(RuntimeError):
+            await manager.reload("index changed")
+        with manager.acquire() as resources:
+            return resources["generation"]
+
+    assert asyncio.run(scenario()) == 1
+    assert manager.status()["version"] == 1
+    assert manager.last_reload["ok"] is False
+    # The broken files aren't retried until they change again
+    assert manager._fingerprint == files.fingerprint()
+
+
+def test_only_one_reload_is_scheduled_at_a_time():
+    files = FakeIndexFiles()
+    manager = make_manager(files)
+
+    async def scenario():
+        first = manager.schedule_reload("admin")
+        second = manager.schedule_reload("admin")
+        await manager._reload_task
+        return first, second
+
+    assert asyncio.run(scenario()) == (True, False)
+    assert len(files.loads) == 1
+
+
+def test_smoke_test_stays_out_of_route_metrics(monkeypatch):
+    fresh = PipelineMetrics()
+    monkeypatch.setattr(model_router, "metrics", fresh)
+    router = ModelRouter(
+        {"extract": {"model": "fake", "temperature": 0.0, "max_tokens": 100}},
+        {"intent": "extract"},
+        llm_factory=lambda model, temperature, max_tokens: FakeListLLM(responses=['{"intent": "find_recipe"}']),
+    )
+    router.register_stage("intent", PromptTemplate(input_variables=["query"], template="{query}"))
+    retriever = type("Retriever", (), {"invoke": lambda self, query: ["doc"]})()
+
+    smoke_test({"retriever": retriever, "router": router})
+
+    assert fresh.snapshot()["routes"] == {}
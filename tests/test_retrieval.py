@@ -0,0 +1,75 @@
+# tests/test_retrieval.py
+
+from types import SimpleNamespace
+
+import faiss
+import numpy as np
+import pytest
+from langchain.docstore.document import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+
+from app.retrieval import MMRRetriever, adaptive_k, mmr_select
+
+
+def test_mmr_with_lambda_one_is_plain_relevance_order():
+    query = np.array([1.0, 0.0])
+    candidates = np.array([[0.5, 0.5], [1.0, 0.0], [0.0, 1.0], [0.9, 0.1]])
+    selected, relevance = mmr_select(query, candidates, 4, lambda_mult=1.0)
+    assert selected.tolist() == np.argsort(-relevance).tolist()
+
+
+def test_mmr_skips_near_duplicates():
+    query = np.array([1.0, 0.0, 0.0])
+    candidates = np.array([[1.0, 0.0, 0.0], [0.99, 0.01, 0.0], [0.7, 0.0, 0.7]])
+    selected, _ = mmr_select(query, candidates, 2, lambda_mult=0.3)
+    assert selected.tolist() == [0, 2]
+
+
+def test_mmr_selects_each_candidate_at_most_once():
+    rng = np.random.default_rng(0)
+    selected, _ = mmr_select(rng.normal(size=16), rng.normal(size=(10, 16)), 10)
+    assert sorted(selected.tolist()) == list(range(10))
+
+
+def test_mmr_k_is_capped_by_the_candidates():
+    selected, relevance = mmr_select(np.ones(4), np.ones((2, 4)), 5)
+    assert len(selected) == 2
+    assert len(relevance) == 2
+
+
+@pytest.mark.parametrize("scores, k_max, expected", [
+    ([0.9, 0.5, 0.4, 0.3], 5, 2),          # clear winner: only k_min
+    ([0.9, 0.88, 0.85, 0.8, 0.78], 5, 5),  # flat distribution: up to k_max
+    ([0.9, 0.85, 0.8, 0.3], 5, 3),
+    ([0.9, 0.89, 0.88], 2, 2),
+    ([0.9], 5, 1),
+    ([], 5, 0),
+])
+def test_adaptive_k(scores, k_max, expected):
+    assert adaptive_k(np.array(scores), k_max, k_min=2, margin=0.15) == expected
+
+
+@pytest.fixture
+def vectorstore():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(20, 8)).astype(np.float32)
+    index = faiss.IndexFlatL2(8)
+    index.add(vectors)
+    # Ids 10-19 are in the index but missing from the docstore
+    docstore = InMemoryDocstore({str(i): Document(page_content=f"doc {i}") for i in range(10)})
+    return SimpleNamespace(index=index, docstore=docstore, index_to_docstore_id={i: str(i) for i in range(20)},
+                           vectors=vectors)
+
+
+def test_retriever_returns_only_documents(vectorstore):
+    embedding = SimpleNamespace(embed_query=lambda query: vectorstore.vectors[15])
+    docs = MMRRetriever(vectorstore, embedding, k=10, fetch_k=20, adaptive=False).invoke("query")
+    assert docs
+    assert all(isinstance(doc, Document) for doc in docs)
+
+
+def test_retriever_puts_the_nearest_document_first(vectorstore):
+    embedding = SimpleNamespace(embed_query=lambda query: vectorstore.vectors[3])
+    docs = MMRRetriever(vectorstore, embedding, k=3, fetch_k=10).invoke("query")
+    assert docs[0].page_content == "doc 3"
+    assert 1 <= len(docs) <= 3